@@ -1,3 +1,8 @@
 from django.contrib import admin
+from .models import LLMUsage
 
 # Register your models here.
+@admin.register(LLMUsage)
+class LLMUsageAdmin(admin.ModelAdmin):
+    list_display = ("user", "endpoint", "total_tokens", "saved_tokens", "created_at")
+    list_filter = ("endpoint",)
@@ -37,4 +37,20 @@ class UserWord(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ("user", "word")
\ No newline at end of file
+        unique_together = ("user", "word")
+
+class LLMUsage(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="llm_usage")
+    endpoint = models.CharField(max_length=32)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    total_tokens = models.PositiveIntegerField(default=0)
+
+    # Estimated prompt tokens avoided by compaction: context sampling in add_new_verbs,
+    # terse spec encoding in llm_generate
+    saved_tokens = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "created_at"], name="api_llmusage_user_created")]
@@ -1,3 +1,195 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import LLMUsage
+from .usage import compact_list, estimate_tokens, record_usage, remaining_budget
+
+SPECS = [
+    {"id": 1, "lemma": "parlare", "pos": "verb", "person": "1s", "tense": "presente"},
+    {"id": 2, "lemma": "casa", "pos": "noun"},
+]
+
+
+def fake_completion(content, prompt_tokens=100, completion_tokens=20):
+    counts = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+    usage = SimpleNamespace(model_dump=lambda: dict(counts), **counts)
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=usage,
+    )
+
+
+class UsageHelpersTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="zack")
+
+    def test_compact_list_no_limit(self):
+        self.assertEqual(compact_list(["a", "b", "c"], 0), ["a", "b", "c"])
+        self.assertEqual(compact_list(["a", "b", "c"], -1), ["a", "b", "c"])
+
+    def test_compact_list_limit_not_reached(self):
+        self.assertEqual(compact_list(["a", "b", "c"], 3), ["a", "b", "c"])
+        self.assertEqual(compact_list(["a", "b", "c"], 10), ["a", "b", "c"])
+
+    def test_compact_list_samples(self):
+        items = [str(i) for i in range(10)]
+        sample = compact_list(items, 4)
+        self.assertEqual(len(sample), 4)
+        self.assertEqual(len(set(sample)), 4)
+        self.assertTrue(set(sample) <= set(items))
+
+    def test_estimate_tokens_rounds_up(self):
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("a"), 1)
+        self.assertEqual(estimate_tokens("abcd"), 1)
+        self.assertEqual(estimate_tokens("abcde"), 2)
+
+    def test_record_usage_without_usage(self):
+        row = record_usage(self.user, "llm_generate", SimpleNamespace(usage=None), saved_tokens=-5)
+        self.assertEqual((row.prompt_tokens, row.completion_tokens, row.total_tokens), (0, 0, 0))
+        self.assertEqual(row.saved_tokens, 0)
+
+    def test_record_usage_without_total_tokens(self):
+        comp = SimpleNamespace(usage=SimpleNamespace(prompt_tokens=30, completion_tokens=12))
+        row = record_usage(self.user, "llm_generate", comp, saved_tokens=7)
+        self.assertEqual(row.total_tokens, 42)
+        self.assertEqual(row.saved_tokens, 7)
+
+    @override_settings(LLM_DAILY_TOKEN_BUDGET=0)
+    def test_remaining_budget_disabled(self):
+        self.assertIsNone(remaining_budget(self.user))
+
+    @override_settings(LLM_DAILY_TOKEN_BUDGET=-10)
+    def test_remaining_budget_negative_is_disabled(self):
+        self.assertIsNone(remaining_budget(self.user))
+
+    @override_settings(LLM_DAILY_TOKEN_BUDGET=1000)
+    def test_remaining_budget_ignores_old_rows(self):
+        old = LLMUsage.objects.create(user=self.user, endpoint="llm_generate", total_tokens=900)
+        LLMUsage.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(hours=25))
+        LLMUsage.objects.create(user=self.user, endpoint="llm_generate", total_tokens=300)
+        self.assertEqual(remaining_budget(self.user), 700)
+
+
+@patch("api.views.client")
+class LLMGenerateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="zack")
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def mock_reply(self, client):
+        content = json.dumps({"sentences": [{"id": 1, "it": "Parlo.", "en": "I speak."}]})
+        client.chat.completions.create.return_value = fake_completion(content)
+
+    def test_records_usage(self, client):
+        self.mock_reply(client)
+        res = self.api.post("/api/llm/generate/", {"specs": SPECS}, format="json")
+        self.assertEqual(res.status_code, 200)
+        row = LLMUsage.objects.get(user=self.user)
+        self.assertEqual((row.endpoint, row.total_tokens), ("llm_generate", 120))
+
+    def test_terse_encoding_accepts_non_string_fields(self, client):
+        self.mock_reply(client)
+        specs = [{"id": 3, "lemma": None, "pos": 5, "person": None, "tense": 1}]
+        res = self.api.post("/api/llm/generate/", {"specs": specs}, format="json")
+        self.assertEqual(res.status_code, 200)
+        prompt = client.chat.completions.create.call_args.kwargs["messages"][1]["content"]
+        self.assertIn("3|None|5|None|1", prompt)
+
+    def test_sent_hidden_by_default(self, client):
+        self.mock_reply(client)
+        res = self.api.post("/api/llm/generate/", {"specs": SPECS}, format="json")
+        self.assertNotIn("sent", res.json())
+
+    def test_sent_hidden_for_falsy_debug_strings(self, client):
+        self.mock_reply(client)
+        for value in ("false", "0", ""):
+            res = self.api.post("/api/llm/generate/", {"specs": SPECS, "debug": value}, format="json")
+            self.assertNotIn("sent", res.json())
+
+    def test_sent_with_debug_body(self, client):
+        self.mock_reply(client)
+        res = self.api.post("/api/llm/generate/", {"specs": SPECS, "debug": True}, format="json")
+        self.assertEqual(res.json()["sent"]["model"], "gpt-4o-mini")
+
+    def test_sent_with_debug_query(self, client):
+        self.mock_reply(client)
+        res = self.api.post("/api/llm/generate/?debug=1", {"specs": SPECS}, format="json")
+        self.assertIn("sent", res.json())
+
+    @override_settings(LLM_DAILY_TOKEN_BUDGET=5000)
+    def test_over_budget_returns_429(self, client):
+        LLMUsage.objects.create(user=self.user, endpoint="llm_generate", total_tokens=4999)
+        res = self.api.post("/api/llm/generate/", {"specs": SPECS}, format="json")
+        self.assertEqual(res.status_code, 429)
+        self.assertEqual(res.json()["usage"]["remaining"], 1)
+        client.chat.completions.create.assert_not_called()
+
+    @override_settings(LLM_DAILY_TOKEN_BUDGET=5000)
+    def test_within_budget_calls_client(self, client):
+        self.mock_reply(client)
+        LLMUsage.objects.create(user=self.user, endpoint="llm_generate", total_tokens=1000)
+        res = self.api.post("/api/llm/generate/", {"specs": SPECS}, format="json")
+        self.assertEqual(res.status_code, 200)
+        client.chat.completions.create.assert_called_once()
+
+
+@patch("api.views.client")
+class AddNewVerbsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="zack")
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_empty_vocabulary_marker(self, client):
+        client.chat.completions.create.return_value = fake_completion(json.dumps({"new_verbs": ["andare"]}))
+        res = self.api.post("/api/words/add-new/")
+        self.assertEqual(res.json()["new_words"], ["andare"])
+        prompt = client.chat.completions.create.call_args.kwargs["messages"][1]["content"]
+        self.assertIn("these Italian verbs: none.", prompt)
+
+
+class LLMUsageViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="zack")
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    @override_settings(LLM_DAILY_TOKEN_BUDGET=10000)
+    def test_per_endpoint_totals(self):
+        LLMUsage.objects.create(user=self.user, endpoint="llm_generate", prompt_tokens=80,
+                                completion_tokens=20, total_tokens=100, saved_tokens=30)
+        LLMUsage.objects.create(user=self.user, endpoint="llm_generate", prompt_tokens=40,
+                                completion_tokens=10, total_tokens=50, saved_tokens=5)
+        LLMUsage.objects.create(user=self.user, endpoint="add_new_verbs", prompt_tokens=60,
+                                completion_tokens=15, total_tokens=75, saved_tokens=12)
+        other = User.objects.create(username="mary")
+        LLMUsage.objects.create(user=other, endpoint="llm_generate", total_tokens=999)
+
+        data = self.api.get("/api/llm/usage/").json()
+        self.assertEqual(data["budget"], 10000)
+        self.assertEqual(data["used_24h"], 225)
+        self.assertEqual(data["remaining"], 9775)
+        self.assertEqual(data["endpoints"]["llm_generate"], {
+            "calls": 2, "prompt_tokens": 120, "completion_tokens": 30,
+            "total_tokens": 150, "saved_tokens": 35,
+        })
+        self.assertEqual(data["endpoints"]["add_new_verbs"]["saved_tokens"], 12)
+
+    @override_settings(LLM_DAILY_TOKEN_BUDGET=-1)
+    def test_budget_disabled(self):
+        data = self.api.get("/api/llm/usage/").json()
+        self.assertIsNone(data["budget"])
+        self.assertIsNone(data["remaining"])
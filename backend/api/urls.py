@@ -14,4 +14,5 @@ urlpatterns = [
     
     path("practice/batch-specs/", views.batch_prompt_specs),
     path("llm/generate/", views.llm_generate),
+    path("llm/usage/", views.llm_usage),
 ]
\ No newline at end of file
@@ -0,0 +1,95 @@
+from datetime import timedelta
+import random
+
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import LLMUsage
+
+# Rough heuristic (~4 chars per token for mixed EN/IT text). Only used for
+# budgeting and savings estimates; billed numbers come from the API usage.
+CHARS_PER_TOKEN = 4
+# Tokens held back for the completion when checking a request against the budget
+COMPLETION_RESERVE = 1000
+BUDGET_WINDOW = timedelta(hours=24)
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def compact_list(items, limit):
+    """
+    Returns at most `limit` items: a random sample when the list is larger.
+    limit <= 0 means no limit.
+    """
+    items = list(items)
+    if limit <= 0 or len(items) <= limit:
+        return items
+    return random.sample(items, limit)
+
+
+def budget_limit():
+    """The per-user token budget, or None if budgets are disabled (setting <= 0)."""
+    budget = settings.LLM_DAILY_TOKEN_BUDGET
+    return budget if budget > 0 else None
+
+
+def tokens_used(user):
+    since = timezone.now() - BUDGET_WINDOW
+    agg = LLMUsage.objects.filter(user=user, created_at__gte=since).aggregate(total=Sum("total_tokens"))
+    return agg["total"] or 0
+
+
+def remaining_budget(user, used=None):
+    """
+    Tokens left for the user in the current window, or None if budgets are disabled.
+    Pass `used` to reuse an already computed tokens_used(user).
+    """
+    budget = budget_limit()
+    if budget is None:
+        return None
+    if used is None:
+        used = tokens_used(user)
+    return max(budget - used, 0)
+
+
+def record_usage(user, endpoint, comp, saved_tokens=0):
+    usage = getattr(comp, "usage", None)
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    return LLMUsage.objects.create(
+        user=user,
+        endpoint=endpoint,
+        prompt_tokens=prompt,
+        completion_tokens=completion,
+        total_tokens=getattr(usage, "total_tokens", 0) or prompt + completion,
+        saved_tokens=max(saved_tokens, 0),
+    )
+
+
+def usage_summary(user, used=None):
+    """
+    Lifetime token totals per endpoint, plus the current budget window.
+    """
+    if used is None:
+        used = tokens_used(user)
+    rows = (
+        LLMUsage.objects.filter(user=user)
+        .values("endpoint")
+        .annotate(
+            calls=Count("id"),
+            prompt_tokens=Sum("prompt_tokens"),
+            completion_tokens=Sum("completion_tokens"),
+            total_tokens=Sum("total_tokens"),
+            saved_tokens=Sum("saved_tokens"),
+        )
+        .order_by("endpoint")
+    )
+    return {
+        "budget": budget_limit(),
+        "used_24h": used,
+        "remaining": remaining_budget(user, used),
+        "endpoints": {r.pop("endpoint"): r for r in rows},
+    }
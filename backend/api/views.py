@@ -5,15 +5,41 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.conf import settings
 from django.db import transaction
 from .models import Word, UserWord
 from .serializers import UserSerializer, WordSerializer, UserWordSerializer, AddWordSerializer
+from .usage import (
+    CHARS_PER_TOKEN, COMPLETION_RESERVE, estimate_tokens, compact_list,
+    tokens_used, remaining_budget, record_usage, usage_summary,
+)
 import random
 import os, json
 from openai import OpenAI
 
 client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 
+def budget_exceeded(user, messages):
+    """
+    Returns a 429 Response if the estimated cost of `messages` (plus a completion
+    reserve) is more than the user has left, else None.
+    Concurrent requests are checked before either is recorded, so this is a soft limit.
+    """
+    used = tokens_used(user)
+    remaining = remaining_budget(user, used)
+    if remaining is None:
+        return None
+    estimate = sum(estimate_tokens(m["content"]) for m in messages) + COMPLETION_RESERVE
+    if estimate > remaining:
+        return Response(
+            {"detail": "LLM token budget exceeded. Try again later.", "usage": usage_summary(user, used)},
+            status=status.HTTP_429_TOO_MANY_REQUESTS,
+        )
+    return None
+
+def parse_debug(value):
+    return value is True or value in ("1", "true")
+
 # --- Auth (dev) ---
 @api_view(["POST"])
 @permission_classes([AllowAny])
@@ -80,25 +106,41 @@ def add_new_verbs(request):
     existing_texts = list(UserWord.objects.filter(user=request.user).values_list("word__text", flat=True))
     
     # 2. Build Prompt
-    # We verify the list isn't empty to avoid JSON errors, though list() handles empty fine.
-    vocab_context = json.dumps(existing_texts) if existing_texts else "[]"
+    # Only a sample of the vocabulary goes into the prompt (comma-separated, no JSON quoting);
+    # duplicates that slip through are still filtered against the full list below.
+    sample = compact_list(existing_texts, settings.LLM_VOCAB_CONTEXT_LIMIT)
+    vocab_context = ",".join(sample) or "none"
+    # Only sampling counts as savings here, not the JSON -> comma-separated switch
+    saved_tokens = estimate_tokens(",".join(existing_texts)) - estimate_tokens(",".join(sample))
     
     prompt = (
         f"The user knows these Italian verbs: {vocab_context}. "
         f"Generate {target_count} NEW, common, high-frequency Italian verbs (infinitive) that are NOT in this list. "
         "Return a JSON object with a key 'new_verbs' containing the list of strings."
     )
+    messages = [
+        {"role": "system", "content": "You are a vocabulary builder. Return ONLY valid JSON."},
+        {"role": "user", "content": prompt}
+    ]
+
+    over_budget = budget_exceeded(request.user, messages)
+    if over_budget:
+        return over_budget
 
     try:
         comp = client.chat.completions.create(
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a vocabulary builder. Return ONLY valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
+            messages=messages,
             response_format={"type": "json_object"},
             temperature=0.5,
         )
+    except Exception as e:
+        return Response({"detail": f"AI Error: {str(e)}"}, status=500)
+
+    # Recorded outside the AI error handling: the call has already been billed
+    record_usage(request.user, "add_new_verbs", comp, saved_tokens)
+
+    try:
         res_json = json.loads(comp.choices[0].message.content)
         candidates = res_json.get("new_verbs", [])
     except Exception as e:
@@ -107,6 +149,7 @@ def add_new_verbs(request):
     added_words = []
     
     # 3. Add them to DB
+    existing_texts = set(existing_texts)
     for text in candidates:
         clean_text = text.strip().lower()
         
@@ -227,24 +270,44 @@ def batch_prompt_specs(request):
 
     return Response(specs)
 
+# Label chars the legacy "ID n: Lemma: x (pos), Person: p, Tense: t" spec format
+# spent per line, beyond the "|" separators of the terse format
+LEGACY_SPEC_LABEL_CHARS = len("ID : Lemma:  ()") - len("||")
+LEGACY_VERB_LABEL_CHARS = len(", Person: , Tense: ") - len("||")
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def llm_generate(request):
+    """
+    Body: {"specs": [...]} or legacy {"spec": {...}}.
+    The prompt is only echoed back as "sent" when {"debug": true} (or ?debug=1) is passed.
+    """
     data = request.data or {}
+    debug = parse_debug(data.get("debug")) or parse_debug(request.query_params.get("debug"))
+    saved_tokens = 0
     
     if "specs" in data:
         specs = data["specs"]
         prompt_lines = [
             "Generate a JSON object with a key 'sentences' containing a list of objects.",
             "Each object must have 'id' (from input), 'it', and 'en'.",
-            "IMPORTANT: Keep sentences at A1/A2 beginner level. Simple Subject-Verb-Object structure. Common vocabulary."
+            "IMPORTANT: Keep sentences at A1/A2 beginner level. Simple Subject-Verb-Object structure. Common vocabulary.",
         ]
+        # Terse encoding: "12|parlare|verb|1s|presente" instead of
+        # "ID 12: Lemma: parlare (verb), Person: 1s, Tense: presente"
+        format_line = "Input, one per line: id|lemma|pos|person|tense (person/tense only for verbs)."
+        prompt_lines.append(format_line)
+        saved_chars = -len(format_line)
         
         for s in specs:
-            details = f"Lemma: {s['lemma']} ({s['pos']})"
+            fields = [s['id'], s['lemma'], s['pos']]
+            saved_chars += LEGACY_SPEC_LABEL_CHARS
             if 'person' in s:
-                details += f", Person: {s['person']}, Tense: {s['tense']}"
-            prompt_lines.append(f"ID {s['id']}: {details}")
+                fields += [s['person'], s['tense']]
+                saved_chars += LEGACY_VERB_LABEL_CHARS
+            prompt_lines.append("|".join(str(f) for f in fields))
+
+        saved_tokens = saved_chars // CHARS_PER_TOKEN
             
         messages = [
             {"role": "system", "content": "You are a helpful Italian tutor for beginners. Create simple, clear sentences. Output ONLY valid JSON."},
@@ -269,6 +332,10 @@ def llm_generate(request):
     else:
         return Response({"detail": "Provide 'spec' or 'specs'."}, status=400)
 
+    over_budget = budget_exceeded(request.user, messages)
+    if over_budget:
+        return over_budget
+
     try:
         comp = client.chat.completions.create(
             model="gpt-4o-mini",
@@ -276,14 +343,33 @@ def llm_generate(request):
             response_format={"type": "json_object"},
             temperature=0.2,
         )
+    except Exception as e:
+        return Response({"detail": str(e)}, status=500)
+
+    # Recorded outside the AI error handling: the call has already been billed
+    record_usage(request.user, "llm_generate", comp, saved_tokens)
+
+    try:
         text = comp.choices[0].message.content or ""
         parsed = json.loads(text)
         
-        return Response({
-            "sent": {"model": "gpt-4o-mini", "messages": messages},
+        payload = {
             "response": text,
             "json": parsed,
             "usage": getattr(comp, "usage", None) and comp.usage.model_dump(),
-        })
+        }
+        if debug:
+            payload["sent"] = {"model": "gpt-4o-mini", "messages": messages}
+        return Response(payload)
     except Exception as e:
-        return Response({"detail": str(e)}, status=500)
\ No newline at end of file
+        return Response({"detail": str(e)}, status=500)
+
+# --- Token Usage ---
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def llm_usage(request):
+    """
+    Per-endpoint token totals (including estimated tokens saved by prompt compaction)
+    and the user's remaining budget.
+    """
+    return Response(usage_summary(request.user))
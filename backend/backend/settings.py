@@ -141,4 +141,10 @@ from datetime import timedelta
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=7),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=30),
-}
\ No newline at end of file
+}
+
+# LLM token budgeting (per user, rolling 24h window). 0 (default) disables the limit.
+# Soft limit: concurrent requests are checked before any of them is recorded.
+LLM_DAILY_TOKEN_BUDGET = int(os.environ.get("LLM_DAILY_TOKEN_BUDGET", "0"))
+# Max number of known words inlined into the add-new-verbs prompt
+LLM_VOCAB_CONTEXT_LIMIT = int(os.environ.get("LLM_VOCAB_CONTEXT_LIMIT", "150"))